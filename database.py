@@ -8,9 +8,21 @@ Key Feature: Connection pooling for efficient resource management
 """
 
 import os
-from typing import Optional, Dict, Any, List
+import re
+import io
+import csv
+import time
+import queue
+import threading
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Iterator
+from cachetools import TTLCache
+import orjson
 import psycopg2
-from psycopg2 import pool, extras
+from psycopg2 import pool, extras, extensions, errors
 from contextlib import contextmanager
 import logging
 
@@ -18,6 +30,74 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Maximum prepared statements kept per connection (0 disables the cache)
+STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 500))
+
+# Connection pool sizing (tunable per deployment).
+# Trade-off: psycopg2's pool closes every connection handed back above
+# minconn, and its prepared statements die with it, so a new connection pays
+# PREPARE + EXECUTE (two round-trips) where a warm one pays one. With the
+# statement cache on, the pool keeps all DB_POOL_MAX connections open
+# (min = max); that holds DB_POOL_MAX idle server backends in exchange for
+# caches that survive. DB_POOL_MIN only applies with the cache disabled.
+POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX', 25))
+POOL_MIN_CONNECTIONS = (POOL_MAX_CONNECTIONS if STATEMENT_CACHE_SIZE > 0
+                        else int(os.getenv('DB_POOL_MIN', 5)))
+POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT', 5))
+
+# Session settings sent in the connection startup packet (no extra round-trip).
+# JIT compilation costs more than it saves on short OLTP queries.
+SESSION_OPTIONS = os.getenv('DB_SESSION_OPTIONS', '-c jit=off')
+APPLICATION_NAME = 'artisan_marketplace'
+
+# Matches psycopg2 positional placeholders and escaped percent signs
+_PLACEHOLDER_RE = re.compile(r'%%|%s')
+
+
+class PoolTimeoutError(pool.PoolError):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class CachingConnection(extensions.connection):
+    """
+    psycopg2 connection that remembers its server-side prepared statements.
+
+    Prepared statements live for the whole database session, so the cache is
+    attached to the connection itself and survives being returned to the pool.
+
+    Connections are always transactional (autocommit off); every user ends
+    its work with commit() or rollback() and never flips the mode.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.autocommit = False
+        self.prepared_statements = OrderedDict()  # SQL text -> statement name
+
+    def reset(self):
+        """Reset the session and forget any prepared statements."""
+        super().reset()
+        self.prepared_statements.clear()
+
+
+def _to_positional(query: str):
+    """
+    Convert a psycopg2 query into PREPARE syntax.
+
+    Returns:
+        Tuple of (query using $1, $2, ... placeholders, parameter count)
+    """
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(0) == '%%':
+            return '%'
+        count += 1
+        return f'${count}'
+
+    return _PLACEHOLDER_RE.sub(replace, query), count
+
 
 class DatabaseManager:
     """
@@ -47,13 +127,29 @@ class DatabaseManager:
                 'password': '6740'
             }
 
+        connect_kwargs = dict(connection_params) if isinstance(
+            connection_params, dict) else {'dsn': connection_params}
+        # Each pooled connection carries its own prepared-statement cache
+        connect_kwargs['connection_factory'] = CachingConnection
+        connect_kwargs['application_name'] = APPLICATION_NAME
+        if SESSION_OPTIONS:
+            connect_kwargs['options'] = SESSION_OPTIONS
+
         try:
-            # Create connection pool (minimum 1, maximum 10 connections)
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                1,  # Minimum connections
-                10,  # Maximum connections
-                **connection_params if isinstance(connection_params, dict) else {'dsn': connection_params}
+            # Create thread-safe connection pool; FastAPI runs sync routes on a
+            # threadpool, and the minimum connections are opened up front so
+            # the first requests don't pay connection setup latency
+            self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS,
+                POOL_MAX_CONNECTIONS,
+                **connect_kwargs
             )
+            # Bounds checkouts so callers wait for a free connection instead
+            # of getting an immediate "pool exhausted" error
+            self._pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+            # Prepared-statement cache counters (approximate under threads)
+            self.statement_cache_hits = 0
+            self.statement_cache_misses = 0
 
             if self.connection_pool:
                 logger.info("✓ Database connection pool created successfully")
@@ -64,6 +160,30 @@ class DatabaseManager:
             logger.error(f"✗ Database connection error: {e}")
             raise
 
+    def acquire_connection(self):
+        """
+        Check a connection out of the pool.
+
+        Waits up to DB_POOL_TIMEOUT seconds for a free connection.
+
+        Raises:
+            PoolTimeoutError: If the pool stays exhausted for the whole timeout
+        """
+        if not self._pool_slots.acquire(timeout=POOL_TIMEOUT_SECONDS):
+            raise PoolTimeoutError("Timed out waiting for a database connection")
+        try:
+            return self.connection_pool.getconn()
+        except Exception:
+            self._pool_slots.release()
+            raise
+
+    def release_connection(self, connection):
+        """Return a connection obtained from acquire_connection() to the pool."""
+        try:
+            self.connection_pool.putconn(connection)
+        finally:
+            self._pool_slots.release()
+
     @contextmanager
     def get_connection(self):
         """
@@ -75,21 +195,22 @@ class DatabaseManager:
                 # use connection
                 pass
         """
-        connection = None
+        connection = self.acquire_connection()
         try:
-            connection = self.connection_pool.getconn()
             yield connection
         finally:
-            if connection:
-                self.connection_pool.putconn(connection)
+            self.release_connection(connection)
 
     @contextmanager
-    def get_cursor(self, commit: bool = False):
+    def get_cursor(self, commit: bool = False, synchronous_commit: bool = True):
         """
         Context manager for database cursors.
 
         Args:
             commit: Whether to commit transaction after cursor operations
+            synchronous_commit: If False, the commit returns without waiting
+                for the WAL flush. Only for non-financial writes (audit logs):
+                a server crash can lose the last few such commits.
 
         Usage:
             with db.get_cursor(commit=True) as cursor:
@@ -98,6 +219,8 @@ class DatabaseManager:
         with self.get_connection() as connection:
             cursor = connection.cursor(cursor_factory=extras.RealDictCursor)
             try:
+                if not synchronous_commit:
+                    cursor.execute("SET LOCAL synchronous_commit = off")
                 yield cursor
                 if commit:
                     connection.commit()
@@ -108,6 +231,69 @@ class DatabaseManager:
             finally:
                 cursor.close()
 
+    def _execute(self, cursor, query: str, params: tuple = None):
+        """
+        Execute a statement through the connection's prepared-statement cache.
+
+        The first time a connection sees a query it issues PREPARE; later calls
+        run EXECUTE so PostgreSQL skips parsing and planning. The least recently
+        used statement is deallocated once the cache is full.
+
+        Args:
+            cursor: Cursor to execute on
+            query: SQL statement using %s placeholders
+            params: Query parameters (positional only)
+        """
+        connection = cursor.connection
+        cache = getattr(connection, 'prepared_statements', None)
+        if cache is None or STATEMENT_CACHE_SIZE <= 0 or isinstance(params, dict):
+            cursor.execute(query, params)
+            return
+
+        name = cache.get(query)
+        if name is None:
+            self.statement_cache_misses += 1
+            if params is None:
+                positional, param_count = query, 0
+            else:
+                positional, param_count = _to_positional(query)
+            digest = hashlib.blake2b(query.encode('utf-8'), digest_size=8).hexdigest()
+            name = f"p_{digest}"
+            cursor.execute(f"PREPARE {name} AS {positional}")
+            cache[query] = name
+
+            if len(cache) > STATEMENT_CACHE_SIZE:
+                _, evicted = cache.popitem(last=False)
+                cursor.execute(f"DEALLOCATE {evicted}")
+        else:
+            self.statement_cache_hits += 1
+            cache.move_to_end(query)
+            param_count = len(params) if params else 0
+
+        try:
+            if param_count:
+                placeholders = ', '.join(['%s'] * param_count)
+                cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+            else:
+                cursor.execute(f"EXECUTE {name}")
+        except errors.InvalidSqlStatementName:
+            # Session was reset behind our back; re-prepare on next use
+            cache.pop(query, None)
+            raise
+
+    def execute_prepared(self, cursor, query: str, params: tuple = None):
+        """
+        Execute on a caller-managed cursor through the prepared-statement cache.
+
+        For routes that run their own transaction on an acquired connection.
+
+        Args:
+            cursor: Cursor to execute on
+            query: SQL statement using %s placeholders
+            params: Query parameters (positional only)
+        """
+        self._execute(cursor, query, params)
+
     def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
         """
         Execute SELECT query and return results as list of dictionaries.
@@ -117,12 +303,40 @@ class DatabaseManager:
             params: Query parameters (for parameterized queries)
 
         Returns:
-            List of rows as dictionaries
+            List of rows as dictionaries (RealDictRow is a dict subclass,
+            so rows are returned as fetched without an extra copy)
         """
         with self.get_cursor() as cursor:
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            return [dict(row) for row in results]
+            self._execute(cursor, query, params)
+            return cursor.fetchall()
+
+    def stream_query(self, query: str, params: tuple = None,
+                     itersize: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Execute SELECT query and yield rows through a server-side cursor.
+
+        Rows are fetched itersize at a time, so large result sets (e.g. CSV
+        exports) are never fully materialized in memory. The connection stays
+        checked out until the generator is exhausted or closed.
+
+        Args:
+            query: SQL SELECT statement
+            params: Query parameters
+            itersize: Rows fetched per network round-trip
+
+        Yields:
+            Rows as dictionaries
+        """
+        with self.get_connection() as connection:
+            cursor = connection.cursor(name='stream_cursor',
+                                       cursor_factory=extras.RealDictCursor)
+            cursor.itersize = itersize
+            try:
+                cursor.execute(query, params)
+                yield from cursor
+            finally:
+                cursor.close()
+                connection.rollback()  # End the read-only transaction
 
     def execute_update(self, query: str, params: tuple = None) -> int:
         """
@@ -136,10 +350,30 @@ class DatabaseManager:
             Number of affected rows
         """
         with self.get_cursor(commit=True) as cursor:
-            cursor.execute(query, params)
+            self._execute(cursor, query, params)
             return cursor.rowcount
 
-    def execute_insert_returning(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
+    def execute_many(self, query: str, params_list: List[tuple], page_size: int = 100) -> int:
+        """
+        Execute the same INSERT, UPDATE, or DELETE query for many parameter sets.
+
+        Uses psycopg2's execute_batch, which sends the statements in pages of
+        page_size instead of paying one network round-trip per row.
+
+        Args:
+            query: SQL modification statement
+            params_list: Sequence of parameter tuples, one per row
+            page_size: Number of statements sent per round-trip
+
+        Returns:
+            Number of affected rows (reported for the last page only)
+        """
+        with self.get_cursor(commit=True) as cursor:
+            extras.execute_batch(cursor, query, params_list, page_size=page_size)
+            return cursor.rowcount
+
+    def execute_insert_returning(self, query: str, params: tuple = None,
+                                 synchronous_commit: bool = True) -> Optional[Dict[str, Any]]:
         """
         Execute INSERT query and return the inserted row.
 
@@ -148,26 +382,125 @@ class DatabaseManager:
         Args:
             query: SQL INSERT statement with RETURNING clause
             params: Query parameters
+            synchronous_commit: See get_cursor()
 
         Returns:
             Inserted row as dictionary
         """
-        with self.get_cursor(commit=True) as cursor:
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-            return dict(result) if result else None
+        with self.get_cursor(commit=True, synchronous_commit=synchronous_commit) as cursor:
+            self._execute(cursor, query, params)
+            return cursor.fetchone()
+
+    def statement_cache_stats(self) -> Dict[str, Any]:
+        """
+        Report how often queries reused a prepared statement.
+
+        Returns:
+            Hit and miss counts and the hit rate (0.0 - 1.0)
+        """
+        hits, misses = self.statement_cache_hits, self.statement_cache_misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses,
+                'hit_rate': hits / total if total else 0.0}
 
     def close_all_connections(self):
         """Close all connections in the pool."""
         if self.connection_pool:
+            stats = self.statement_cache_stats()
+            logger.info(f"✓ Prepared statement cache: {stats['hits']} hits, "
+                        f"{stats['misses']} misses ({stats['hit_rate']:.1%})")
             self.connection_pool.closeall()
             logger.info("✓ All database connections closed")
 
 
+# ============================================================================
+# READ CACHE - Hot lookups by ID
+# ============================================================================
+# Products and users are read far more often than they change. Lookups by ID
+# are cached in-process for a short TTL; writers invalidate their entries.
+# Never use these caches inside a locking (FOR UPDATE) transaction.
+
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', 30))
+
+_product_cache = TTLCache(maxsize=10_000, ttl=CACHE_TTL_SECONDS)
+_user_cache = TTLCache(maxsize=10_000, ttl=CACHE_TTL_SECONDS)
+# Listing pages, keyed by catalog version so any product change misses
+_product_list_cache = TTLCache(maxsize=1024, ttl=CACHE_TTL_SECONDS)
+_cache_lock = threading.RLock()  # TTLCache is not thread-safe
+# Per-product invalidation counters; a reader that started before an
+# invalidation must not put its (possibly older) row back into the cache
+_product_generations: Dict[int, int] = {}
+
+
+def _cache_get(cache: TTLCache, key):
+    with _cache_lock:
+        return cache.get(key)
+
+
+def _cache_set(cache: TTLCache, key, value):
+    with _cache_lock:
+        cache[key] = value
+
+
+def invalidate_product_cache(product_id: int):
+    """Drop a product from the read cache after its row changes."""
+    with _cache_lock:
+        _product_generations[product_id] = _product_generations.get(product_id, 0) + 1
+        _product_cache.pop(product_id, None)
+        _invalidate_catalog()
+
+
+def _invalidate_catalog():
+    """Forget the catalog version and listing pages (call with _cache_lock held)."""
+    # A page cached under the old version may have read rows from after the
+    # write committed (version is read first); drop pages as well
+    _catalog_version_cache.clear()
+    _product_list_cache.clear()
+
+
+# Catalog version (catalog_version table) backs the product list ETag and cache.
+# Kept much shorter than the row cache since every listing depends on it.
+CATALOG_VERSION_TTL_SECONDS = int(os.getenv('CATALOG_VERSION_TTL_SECONDS', 5))
+
+_catalog_version_cache = TTLCache(maxsize=1, ttl=CATALOG_VERSION_TTL_SECONDS)
+
+_Q_GET_CATALOG_VERSION = "SELECT version FROM catalog_version"
+
+
+def get_catalog_version(db: DatabaseManager) -> str:
+    """
+    Get a token that changes whenever any product row changes.
+
+    A deferred trigger on products bumps catalog_version when an insert,
+    update (including stock changes) or delete commits. Read the version
+    before the data it labels: the body can then only be newer than its
+    ETag, never older.
+
+    Args:
+        db: DatabaseManager instance
+
+    Returns:
+        Opaque version string
+    """
+    version = _cache_get(_catalog_version_cache, 'catalog')
+    if version is None:
+        version = str(db.execute_query(_Q_GET_CATALOG_VERSION)[0]['version'])
+        _cache_set(_catalog_version_cache, 'catalog', version)
+    return version
+
+
 # ============================================================================
 # DATABASE OPERATIONS - User Management
 # ============================================================================
 
+_Q_CREATE_USER = """
+    INSERT INTO users (username, password_hash, role, full_name, email, phone)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+    RETURNING user_id, username, role, full_name, email, phone, created_at
+"""
+
+
 def create_user(db: DatabaseManager, username: str, password_hash: str,
                 role: str, full_name: str, email: str, phone: str = None) -> Optional[Dict[str, Any]]:
     """
@@ -183,14 +516,13 @@ def create_user(db: DatabaseManager, username: str, password_hash: str,
         phone: Optional phone number
 
     Returns:
-        Created user data (without password_hash)
-    """
-    query = """
-        INSERT INTO users (username, password_hash, role, full_name, email, phone)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING user_id, username, role, full_name, email, phone, created_at
+        Created user data (without password_hash), or None if the username
+        or email is already taken
     """
-    return db.execute_insert_returning(query, (username, password_hash, role, full_name, email, phone))
+    return db.execute_insert_returning(_Q_CREATE_USER, (username, password_hash, role, full_name, email, phone))
+
+
+_Q_GET_USER_BY_USERNAME = "SELECT * FROM users WHERE username = %s"
 
 
 def get_user_by_username(db: DatabaseManager, username: str) -> Optional[Dict[str, Any]]:
@@ -204,11 +536,16 @@ def get_user_by_username(db: DatabaseManager, username: str) -> Optional[Dict[st
     Returns:
         User data including password_hash
     """
-    query = "SELECT * FROM users WHERE username = %s"
-    results = db.execute_query(query, (username,))
+    results = db.execute_query(_Q_GET_USER_BY_USERNAME, (username,))
     return results[0] if results else None
 
 
+_Q_GET_USER_BY_ID = """
+    SELECT user_id, username, role, full_name, email, phone, created_at 
+    FROM users WHERE user_id = %s
+"""
+
+
 def get_user_by_id(db: DatabaseManager, user_id: int) -> Optional[Dict[str, Any]]:
     """
     Retrieve user by ID (without password_hash).
@@ -220,18 +557,67 @@ def get_user_by_id(db: DatabaseManager, user_id: int) -> Optional[Dict[str, Any]
     Returns:
         User data (safe for API responses)
     """
-    query = """
-        SELECT user_id, username, role, full_name, email, phone, created_at 
-        FROM users WHERE user_id = %s
+    user = _cache_get(_user_cache, user_id)
+    if user is not None:
+        return user
+
+    results = db.execute_query(_Q_GET_USER_BY_ID, (user_id,))
+    user = results[0] if results else None
+    if user:
+        _cache_set(_user_cache, user_id, user)
+    return user
+
+
+_Q_GET_USERS = """
+    SELECT user_id, username, role, full_name, email, phone, created_at
+    FROM users
+    ORDER BY created_at DESC, user_id DESC
+    LIMIT %s
+"""
+
+_Q_GET_USERS_BEFORE = """
+    SELECT user_id, username, role, full_name, email, phone, created_at
+    FROM users
+    WHERE (created_at, user_id) < (%s, %s)
+    ORDER BY created_at DESC, user_id DESC
+    LIMIT %s
+"""
+
+
+def get_users(db: DatabaseManager, limit: int = 100,
+              before: Optional[tuple] = None) -> List[Dict[str, Any]]:
     """
-    results = db.execute_query(query, (user_id,))
-    return results[0] if results else None
+    Retrieve one page of users, newest first (for the admin panel).
+
+    Uses keyset pagination: pass the (created_at, user_id) of the last user
+    on the previous page instead of an offset.
+
+    Args:
+        db: DatabaseManager instance
+        limit: Maximum number of users to return
+        before: (created_at, user_id) to continue after, or None for page one
+
+    Returns:
+        List of users (without password_hash)
+    """
+    if before is None:
+        return db.execute_query(_Q_GET_USERS, (limit,))
+    created_at, user_id = before
+    return db.execute_query(_Q_GET_USERS_BEFORE, (created_at, user_id, limit))
 
 
 # ============================================================================
 # DATABASE OPERATIONS - Product Management
 # ============================================================================
 
+_Q_CREATE_PRODUCT = """
+    INSERT INTO products (artisan_id, product_name, description, price, 
+                         stock_quantity, category, image_url)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING product_id, artisan_id, product_name, price, stock_quantity, category, created_at
+"""
+
+
 def create_product(db: DatabaseManager, artisan_id: int, product_name: str,
                    description: str, price: float, stock_quantity: int,
                    category: str, image_url: str = None) -> Optional[Dict[str, Any]]:
@@ -249,37 +635,74 @@ def create_product(db: DatabaseManager, artisan_id: int, product_name: str,
         image_url: Optional product image URL
 
     Returns:
-        Created product data
-    """
-    query = """
-        INSERT INTO products (artisan_id, product_name, description, price, 
-                             stock_quantity, category, image_url)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        RETURNING *
+        Created product's ID, name, price, stock, category and timestamp
     """
-    return db.execute_insert_returning(
-        query,
+    product = db.execute_insert_returning(
+        _Q_CREATE_PRODUCT,
         (artisan_id, product_name, description,
          price, stock_quantity, category, image_url)
     )
+    with _cache_lock:
+        _invalidate_catalog()
+    return product
 
 
-def get_all_products(db: DatabaseManager, available_only: bool = False) -> List[Dict[str, Any]]:
+# Columns needed by product listings (skips updated_at and other bookkeeping)
+PRODUCT_LIST_COLUMNS = """
+    product_id, artisan_id, product_name, description, price,
+    stock_quantity, category, image_url, created_at
+"""
+
+_Q_GET_ALL_PRODUCTS = f"""
+    SELECT {PRODUCT_LIST_COLUMNS} FROM products
+    ORDER BY created_at DESC, product_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+_Q_GET_AVAILABLE_PRODUCTS = f"""
+    SELECT {PRODUCT_LIST_COLUMNS} FROM products
+    WHERE stock_quantity > 0
+    ORDER BY created_at DESC, product_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def get_all_products(db: DatabaseManager, available_only: bool = False,
+                     limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
     """
-    Retrieve all products, optionally filtering for available stock.
+    Retrieve one page of products, newest first, optionally filtering for available stock.
 
     Args:
         db: DatabaseManager instance
         available_only: If True, only return products with stock > 0
+        limit: Maximum number of products to return
+        offset: Number of products to skip
 
     Returns:
-        List of products
+        List of products (served from the read cache while the catalog
+        version is unchanged)
+    """
+    cache_key = (get_catalog_version(db), available_only, limit, offset)
+    products = _cache_get(_product_list_cache, cache_key)
+    if products is not None:
+        return products
+
+    query = _Q_GET_AVAILABLE_PRODUCTS if available_only else _Q_GET_ALL_PRODUCTS
+    products = db.execute_query(query, (limit, offset))
+    _cache_set(_product_list_cache, cache_key, products)
+    return products
+
+
+def get_cached_product(product_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Look a product up in the read cache only (never touches the database).
+
+    Safe to call from async code; returns None on a miss.
     """
-    if available_only:
-        query = "SELECT * FROM products WHERE stock_quantity > 0 ORDER BY created_at DESC"
-    else:
-        query = "SELECT * FROM products ORDER BY created_at DESC"
-    return db.execute_query(query)
+    return _cache_get(_product_cache, product_id)
+
+
+_Q_GET_PRODUCT_BY_ID = "SELECT * FROM products WHERE product_id = %s"
 
 
 def get_product_by_id(db: DatabaseManager, product_id: int) -> Optional[Dict[str, Any]]:
@@ -291,11 +714,25 @@ def get_product_by_id(db: DatabaseManager, product_id: int) -> Optional[Dict[str
         product_id: Product ID
 
     Returns:
-        Product data
+        Product data (served from the read cache when fresh)
     """
-    query = "SELECT * FROM products WHERE product_id = %s"
-    results = db.execute_query(query, (product_id,))
-    return results[0] if results else None
+    with _cache_lock:
+        product = _product_cache.get(product_id)
+        generation = _product_generations.get(product_id, 0)
+    if product is not None:
+        return product
+
+    results = db.execute_query(_Q_GET_PRODUCT_BY_ID, (product_id,))
+    product = results[0] if results else None
+    if product:
+        with _cache_lock:
+            # Skip the store if the row was invalidated while we were reading
+            if _product_generations.get(product_id, 0) == generation:
+                _product_cache[product_id] = product
+    return product
+
+
+_Q_GET_PRODUCTS_BY_ARTISAN = "SELECT * FROM artisan_products_view WHERE artisan_id = %s"
 
 
 def get_products_by_artisan(db: DatabaseManager, artisan_id: int) -> List[Dict[str, Any]]:
@@ -309,96 +746,100 @@ def get_products_by_artisan(db: DatabaseManager, artisan_id: int) -> List[Dict[s
     Returns:
         List of products
     """
-    query = "SELECT * FROM artisan_products_view WHERE product_id IN (SELECT product_id FROM products WHERE artisan_id = %s)"
-    return db.execute_query(query, (artisan_id,))
-
-
-def update_product_stock(db: DatabaseManager, product_id: int, new_quantity: int) -> int:
-    """
-    Update product stock quantity.
-
-    Args:
-        db: DatabaseManager instance
-        product_id: Product ID
-        new_quantity: New stock quantity
-
-    Returns:
-        Number of affected rows
-    """
-    query = "UPDATE products SET stock_quantity = %s WHERE product_id = %s"
-    return db.execute_update(query, (new_quantity, product_id))
+    return db.execute_query(_Q_GET_PRODUCTS_BY_ARTISAN, (artisan_id,))
 
 
 # ============================================================================
 # DATABASE OPERATIONS - Order Management
 # ============================================================================
 
-def create_order(db: DatabaseManager, buyer_id: int, product_id: int,
-                 quantity: int, total_price: float, shipping_address: str) -> Optional[Dict[str, Any]]:
-    """
-    Create a new order.
+_BUYER_ORDERS_SELECT = """
+    SELECT o.order_id, o.product_id, o.quantity, o.total_price, o.status,
+           o.shipping_address, o.created_at,
+           p.product_name, p.image_url, u.full_name as artisan_name
+    FROM orders o
+    JOIN products p ON o.product_id = p.product_id
+    JOIN users u ON p.artisan_id = u.user_id
+    WHERE o.buyer_id = %s
+"""
 
-    Args:
-        db: DatabaseManager instance
-        buyer_id: Buyer's user ID
-        product_id: Product being ordered
-        quantity: Quantity ordered
-        total_price: Total order price
-        shipping_address: Delivery address
+_Q_GET_ORDERS_BY_BUYER = _BUYER_ORDERS_SELECT + """
+    ORDER BY o.created_at DESC, o.order_id DESC
+    LIMIT %s
+"""
 
-    Returns:
-        Created order data
-    """
-    query = """
-        INSERT INTO orders (buyer_id, product_id, quantity, total_price, shipping_address)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING *
-    """
-    return db.execute_insert_returning(query, (buyer_id, product_id, quantity, total_price, shipping_address))
+_Q_GET_ORDERS_BY_BUYER_BEFORE = _BUYER_ORDERS_SELECT + """
+      AND (o.created_at, o.order_id) < (%s, %s)
+    ORDER BY o.created_at DESC, o.order_id DESC
+    LIMIT %s
+"""
 
 
-def get_orders_by_buyer(db: DatabaseManager, buyer_id: int) -> List[Dict[str, Any]]:
+def get_orders_by_buyer(db: DatabaseManager, buyer_id: int, limit: int = 50,
+                        before: Optional[tuple] = None) -> List[Dict[str, Any]]:
     """
-    Retrieve all orders by a buyer.
+    Retrieve one page of a buyer's orders, newest first.
 
     Args:
         db: DatabaseManager instance
         buyer_id: Buyer's user ID
+        limit: Maximum number of orders to return
+        before: (created_at, order_id) to continue after, or None for page one
 
     Returns:
         List of orders with product details
     """
-    query = """
-        SELECT o.*, p.product_name, p.image_url, u.full_name as artisan_name
-        FROM orders o
-        JOIN products p ON o.product_id = p.product_id
-        JOIN users u ON p.artisan_id = u.user_id
-        WHERE o.buyer_id = %s
-        ORDER BY o.created_at DESC
-    """
-    return db.execute_query(query, (buyer_id,))
+    if before is None:
+        return db.execute_query(_Q_GET_ORDERS_BY_BUYER, (buyer_id, limit))
+    created_at, order_id = before
+    return db.execute_query(_Q_GET_ORDERS_BY_BUYER_BEFORE,
+                            (buyer_id, created_at, order_id, limit))
+
+
+_ARTISAN_ORDERS_SELECT = """
+    SELECT o.order_id, o.product_id, o.quantity, o.total_price, o.status,
+           o.shipping_address, o.created_at,
+           p.product_name, u.full_name as buyer_name, u.phone as buyer_phone
+    FROM orders o
+    JOIN products p ON o.product_id = p.product_id
+    JOIN users u ON o.buyer_id = u.user_id
+    WHERE p.artisan_id = %s
+"""
+
+_Q_GET_ORDERS_BY_ARTISAN = _ARTISAN_ORDERS_SELECT + """
+    ORDER BY o.created_at DESC, o.order_id DESC
+    LIMIT %s
+"""
+
+_Q_GET_ORDERS_BY_ARTISAN_BEFORE = _ARTISAN_ORDERS_SELECT + """
+      AND (o.created_at, o.order_id) < (%s, %s)
+    ORDER BY o.created_at DESC, o.order_id DESC
+    LIMIT %s
+"""
 
 
-def get_orders_by_artisan(db: DatabaseManager, artisan_id: int) -> List[Dict[str, Any]]:
+def get_orders_by_artisan(db: DatabaseManager, artisan_id: int, limit: int = 50,
+                          before: Optional[tuple] = None) -> List[Dict[str, Any]]:
     """
-    Retrieve all orders for an artisan's products.
+    Retrieve one page of orders for an artisan's products, newest first.
 
     Args:
         db: DatabaseManager instance
         artisan_id: Artisan's user ID
+        limit: Maximum number of orders to return
+        before: (created_at, order_id) to continue after, or None for page one
 
     Returns:
         List of orders
     """
-    query = """
-        SELECT o.*, p.product_name, u.full_name as buyer_name, u.phone as buyer_phone
-        FROM orders o
-        JOIN products p ON o.product_id = p.product_id
-        JOIN users u ON o.buyer_id = u.user_id
-        WHERE p.artisan_id = %s
-        ORDER BY o.created_at DESC
-    """
-    return db.execute_query(query, (artisan_id,))
+    if before is None:
+        return db.execute_query(_Q_GET_ORDERS_BY_ARTISAN, (artisan_id, limit))
+    created_at, order_id = before
+    return db.execute_query(_Q_GET_ORDERS_BY_ARTISAN_BEFORE,
+                            (artisan_id, created_at, order_id, limit))
+
+
+_Q_UPDATE_ORDER_STATUS = "UPDATE orders SET status = %s WHERE order_id = %s"
 
 
 def update_order_status(db: DatabaseManager, order_id: int, new_status: str) -> int:
@@ -413,61 +854,146 @@ def update_order_status(db: DatabaseManager, order_id: int, new_status: str) ->
     Returns:
         Number of affected rows
     """
-    query = "UPDATE orders SET status = %s WHERE order_id = %s"
-    return db.execute_update(query, (new_status, order_id))
+    return db.execute_update(_Q_UPDATE_ORDER_STATUS, (new_status, order_id))
 
 
 # ============================================================================
 # DATABASE OPERATIONS - Transaction & Audit
 # ============================================================================
 
-def create_transaction(db: DatabaseManager, order_id: int, artisan_id: int,
-                       buyer_id: int, product_id: int, amount: float) -> Optional[Dict[str, Any]]:
+_Q_GET_ALL_TRANSACTIONS = """
+    SELECT * FROM admin_financial_audit
+    ORDER BY transaction_date DESC, transaction_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+_Q_GET_TRANSACTIONS_SINCE = """
+    SELECT * FROM admin_financial_audit
+    WHERE transaction_date >= %s
+    ORDER BY transaction_date DESC, transaction_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def get_all_transactions(db: DatabaseManager, limit: Optional[int] = 100, offset: int = 0,
+                         since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Retrieve one page of transactions, newest first (for admin audit).
+
+    Args:
+        db: DatabaseManager instance
+        limit: Maximum number of transactions (None returns every row)
+        offset: Number of transactions to skip
+        since: Only include transactions on or after this time
+
+    Returns:
+        List of transactions with full details
+    """
+    if since is None:
+        return db.execute_query(_Q_GET_ALL_TRANSACTIONS, (limit, offset))
+    return db.execute_query(_Q_GET_TRANSACTIONS_SINCE, (since, limit, offset))
+
+
+_Q_GET_TRANSACTIONS_SUMMARY = """
+    SELECT transaction_count, total_revenue, total_commission, total_artisan_payout
+    FROM financial_summary
+"""
+
+
+def get_transactions_summary(db: DatabaseManager) -> Dict[str, Any]:
     """
-    Create a financial transaction record.
+    Get all-time revenue, commission and payout totals.
 
-    Automatically calculates 5% commission and artisan payout.
+    Read from the financial_summary materialized view, so the totals can lag
+    new transactions by up to one SummaryRefresher interval.
 
     Args:
         db: DatabaseManager instance
-        order_id: Associated order ID
-        artisan_id: Artisan's user ID
-        buyer_id: Buyer's user ID
-        product_id: Product ID
-        amount: Total transaction amount
 
     Returns:
-        Created transaction data
+        Transaction count and totals
     """
-    commission_rate = 0.05  # 5% platform commission
-    commission_fee = round(amount * commission_rate, 2)
-    artisan_payout = round(amount - commission_fee, 2)
+    return db.execute_query(_Q_GET_TRANSACTIONS_SUMMARY)[0]
+
+
+# Not PREPAREable, so it bypasses the statement cache
+_Q_REFRESH_FINANCIAL_SUMMARY = "REFRESH MATERIALIZED VIEW CONCURRENTLY financial_summary"
 
-    query = """
-        INSERT INTO transactions (order_id, artisan_id, buyer_id, product_id, 
-                                 amount, commission_fee, artisan_payout)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        RETURNING *
+
+def refresh_financial_summary(db: DatabaseManager):
     """
-    return db.execute_insert_returning(
-        query,
-        (order_id, artisan_id, buyer_id, product_id,
-         amount, commission_fee, artisan_payout)
-    )
+    Recompute the financial_summary materialized view.
+
+    Args:
+        db: DatabaseManager instance
+    """
+    with db.get_cursor(commit=True) as cursor:
+        cursor.execute(_Q_REFRESH_FINANCIAL_SUMMARY)
+
+
+_Q_ITER_TRANSACTIONS = """
+    SELECT * FROM admin_financial_audit
+    ORDER BY transaction_date DESC, transaction_id DESC
+"""
 
 
-def get_all_transactions(db: DatabaseManager) -> List[Dict[str, Any]]:
+def iter_all_transactions(db: DatabaseManager) -> Iterator[Dict[str, Any]]:
     """
-    Retrieve all transactions (for admin audit).
+    Stream every transaction through a server-side cursor (for exports).
 
     Args:
         db: DatabaseManager instance
 
+    Yields:
+        Transactions with full details, newest first
+    """
+    return db.stream_query(_Q_ITER_TRANSACTIONS)
+
+
+_Q_GET_DAILY_TRANSACTION_TOTALS = """
+    SELECT date_trunc('day', transaction_date) AS day,
+           COUNT(*) AS transaction_count,
+           SUM(amount) AS total_revenue,
+           SUM(commission_fee) AS total_commission,
+           SUM(artisan_payout) AS total_artisan_payout
+    FROM transactions
+    WHERE transaction_date >= %s
+    GROUP BY 1
+    ORDER BY 1 DESC
+"""
+
+
+def get_daily_transaction_totals(db: DatabaseManager, since: datetime) -> List[Dict[str, Any]]:
+    """
+    Aggregate revenue, commission and payouts per day in the database.
+
+    Args:
+        db: DatabaseManager instance
+        since: First day to include
+
     Returns:
-        List of transactions with full details
+        One row per day with totals, newest first
     """
-    query = "SELECT * FROM admin_financial_audit"
-    return db.execute_query(query)
+    return db.execute_query(_Q_GET_DAILY_TRANSACTION_TOTALS, (since,))
+
+
+def json_default(obj):
+    """orjson `default` hook for types it doesn't handle natively (NUMERIC columns)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _json_dumps(obj) -> str:
+    """orjson-backed drop-in for json.dumps (audit details payloads)"""
+    return orjson.dumps(obj, default=json_default).decode('utf-8')
+
+
+_Q_CREATE_AUDIT_LOG = """
+    INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id, details, ip_address)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    RETURNING log_id, created_at
+"""
 
 
 def create_audit_log(db: DatabaseManager, user_id: int, action_type: str,
@@ -486,22 +1012,165 @@ def create_audit_log(db: DatabaseManager, user_id: int, action_type: str,
         ip_address: User's IP address
 
     Returns:
-        Created audit log entry
+        Created audit log entry's ID and timestamp
     """
-    import json
-    details_json = json.dumps(details) if details else None
+    # Json adapts the dict straight to a jsonb parameter, no ::jsonb cast needed
+    details_json = extras.Json(details, dumps=_json_dumps) if details else None
 
-    query = """
-        INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id, details, ip_address)
-        VALUES (%s, %s, %s, %s, %s::jsonb, %s)
-        RETURNING *
-    """
+    # Audit entries are not financial records, so skip waiting on the WAL flush
     return db.execute_insert_returning(
-        query,
-        (user_id, action_type, entity_type, entity_id, details_json, ip_address)
+        _Q_CREATE_AUDIT_LOG,
+        (user_id, action_type, entity_type, entity_id, details_json, ip_address),
+        synchronous_commit=False
     )
 
 
+_Q_COPY_AUDIT_LOGS = """
+    COPY audit_logs (user_id, action_type, entity_type, entity_id, details, ip_address)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+
+def bulk_create_audit_logs(db: DatabaseManager, events: List[tuple]) -> int:
+    """
+    Insert many audit log entries with a single COPY.
+
+    Args:
+        db: DatabaseManager instance
+        events: Tuples of (user_id, action_type, entity_type, entity_id,
+                details, ip_address), as accepted by create_audit_log
+
+    Returns:
+        Number of rows written
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for user_id, action_type, entity_type, entity_id, details, ip_address in events:
+        # Empty unquoted CSV fields are loaded as NULL
+        writer.writerow((user_id, action_type, entity_type, entity_id,
+                         _json_dumps(details) if details else None, ip_address))
+    buffer.seek(0)
+
+    with db.get_cursor(commit=True, synchronous_commit=False) as cursor:
+        cursor.copy_expert(_Q_COPY_AUDIT_LOGS, buffer)
+        return cursor.rowcount
+
+
+class AuditLogWriter:
+    """
+    Background writer that batches audit log entries off the request path.
+
+    Routes call log(), which only enqueues the event. A daemon thread flushes
+    the queue with bulk_create_audit_logs() every flush_interval seconds or
+    once batch_size events are waiting, whichever comes first.
+    """
+
+    def __init__(self, db: DatabaseManager, flush_interval: float = 0.1,
+                 batch_size: int = 1000, max_queue_size: int = 10_000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background flush thread."""
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush any queued events and stop the background thread."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def log(self, user_id: int, action_type: str, entity_type: str = None,
+            entity_id: int = None, details: dict = None, ip_address: str = None):
+        """
+        Queue an audit log entry (same arguments as create_audit_log).
+
+        Falls back to a direct INSERT if the queue is full, so no event is lost.
+        """
+        event = (user_id, action_type, entity_type, entity_id, details, ip_address)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            create_audit_log(self.db, *event)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch: List[tuple]):
+        try:
+            bulk_create_audit_logs(self.db, batch)
+        except Exception as e:
+            # One bad row fails the whole COPY; retry row by row to keep the rest
+            logger.error(f"Audit log COPY failed, retrying per row: {e}")
+            for event in batch:
+                try:
+                    create_audit_log(self.db, *event)
+                except Exception as row_error:
+                    logger.error(f"✗ Dropped audit log entry {event}: {row_error}")
+
+
+class SummaryRefresher:
+    """
+    Background thread that refreshes the financial_summary materialized view
+    every interval seconds, keeping the aggregation off the request path.
+    """
+
+    def __init__(self, db: DatabaseManager, interval: float = 30.0):
+        self.db = db
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background refresh thread."""
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="summary-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread (an in-progress refresh finishes first)."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # Refresh immediately on start so the view never serves data from
+        # before the restart, then once per interval until stopped
+        while True:
+            try:
+                refresh_financial_summary(self.db)
+            except Exception as e:
+                logger.error(f"✗ Financial summary refresh failed: {e}")
+            if self._stopping.wait(self.interval):
+                break
+
+
 # ============================================================================
 # EXPLANATION FOR FACULTY
 # ============================================================================
@@ -509,9 +1178,13 @@ def create_audit_log(db: DatabaseManager, user_id: int, action_type: str,
 # DATABASE MODULE ARCHITECTURE:
 #
 # 1. CONNECTION POOLING:
-#    - Uses psycopg2.pool.SimpleConnectionPool for efficient resource management
-#    - Maintains 1-10 concurrent connections to handle multiple requests
+#    - Uses psycopg2.pool.ThreadedConnectionPool, safe for FastAPI's threadpool
+#    - Maintains up to 25 concurrent connections (DB_POOL_MAX); with the
+#      statement cache on, all of them stay open so their caches survive
+#    - Requests wait up to DB_POOL_TIMEOUT seconds for a free connection
 #    - Connections are automatically reused, improving performance
+#    - Each connection caches PREPAREd statements so repeated queries skip
+#      parsing and planning (size set by DB_STATEMENT_CACHE_SIZE)
 #
 # 2. CONTEXT MANAGERS:
 #    - get_connection() and get_cursor() use Python's 'with' statement
@@ -522,6 +1195,8 @@ def create_audit_log(db: DatabaseManager, user_id: int, action_type: str,
 #    - Separate functions for different query types (SELECT, INSERT, UPDATE)
 #    - Parameterized queries prevent SQL injection attacks
 #    - RealDictCursor returns results as dictionaries for easy JSON conversion
+#    - SQL text is built once at import (_Q_* constants), so every call passes
+#      the same string object to the prepared-statement cache
 #
 # 4. BUSINESS LOGIC:
 #    - Helper functions encapsulate common database operations
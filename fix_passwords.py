@@ -1,25 +1,26 @@
+import os
 import bcrypt
 from database import DatabaseManager
 
-# Generate correct password hash
+# Generate correct password hash (same work factor as main.hash_password)
 password = "password123"
-password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+rounds = int(os.getenv("BCRYPT_ROUNDS", 10))
+password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
 
 print(f"Generated hash: {password_hash}")
 
 # Update database
 db = DatabaseManager()
+usernames = ['artisan1', 'buyer1', 'admin1']
 
-for username in ['artisan1', 'buyer1', 'admin1']:
-    query = "UPDATE users SET password_hash = %s WHERE username = %s"
-    rows = db.execute_update(query, (password_hash, username))
-    print(f"Updated {username}: {rows} row(s)")
+# One batched round-trip instead of one UPDATE per user
+query = "UPDATE users SET password_hash = %s WHERE username = %s"
+db.execute_many(query, [(password_hash, username) for username in usernames])
+print(f"Updated {', '.join(usernames)}")
 
 print("\nVerifying...")
-for username in ['artisan1', 'buyer1', 'admin1']:
-    query = "SELECT password_hash FROM users WHERE username = %s"
-    result = db.execute_query(query, (username,))
-    if result:
-        stored_hash = result[0]['password_hash']
-        is_valid = bcrypt.checkpw(password.encode(), stored_hash.encode())
-        print(f"{username}: Valid={is_valid}")
+query = "SELECT username, password_hash FROM users WHERE username = ANY(%s)"
+for result in db.execute_query(query, (usernames,)):
+    stored_hash = result['password_hash']
+    is_valid = bcrypt.checkpw(password.encode(), stored_hash.encode())
+    print(f"{result['username']}: Valid={is_valid}")
@@ -4,27 +4,39 @@ Local Artisan E-Marketplace - FastAPI Backend
 ============================================================================
 Purpose: Secure REST API for managing artisan products and preventing
          double-selling through PostgreSQL transaction locking
-Key Feature: Race condition prevention using FOR UPDATE NOWAIT
+Key Feature: Race condition prevention using an atomic conditional UPDATE
 ============================================================================
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from typing import Annotated, Literal, Optional, List
 import jwt
 import bcrypt
 from datetime import datetime, timedelta
+from decimal import Decimal
+import hashlib
 import logging
 import os
+import threading
+import time
+from cachetools import TTLCache
+import anyio.to_thread
+import orjson
+import psycopg2
+from psycopg2 import errors
 from database import (
-    DatabaseManager, create_user, get_user_by_username, get_user_by_id,
+    DatabaseManager, PoolTimeoutError, create_user, get_user_by_username, get_user_by_id,
     create_product, get_all_products, get_product_by_id, get_products_by_artisan,
-    create_order, get_orders_by_buyer, get_orders_by_artisan, update_order_status,
-    create_transaction, get_all_transactions, create_audit_log, update_product_stock
+    get_orders_by_buyer, get_orders_by_artisan, update_order_status,
+    get_all_transactions,
+    invalidate_product_cache, get_daily_transaction_totals, AuditLogWriter,
+    get_catalog_version, get_transactions_summary, get_cached_product,
+    get_users, SummaryRefresher, json_default
 )
 
 # Configure logging
@@ -35,10 +47,23 @@ logger = logging.getLogger(__name__)
 # APPLICATION SETUP
 # ============================================================================
 
+class FastJSONResponse(ORJSONResponse):
+    """
+    orjson-backed JSON response.
+
+    Routes that return it directly skip FastAPI's jsonable_encoder pass, so
+    database rows (dicts with datetime/Decimal values) go straight to orjson.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
 app = FastAPI(
     title="Local Artisan E-Marketplace API",
     description="Secure marketplace for Bangladeshi artisans with inventory locking",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS Configuration - Allow frontend to access API
@@ -53,12 +78,66 @@ app.add_middleware(
 # Initialize database
 db = DatabaseManager()
 
+# Audit entries outside the purchase transaction are written in batches
+audit_log = AuditLogWriter(db)
+
+# Keeps the financial_summary materialized view (admin audit totals) current
+summary_refresher = SummaryRefresher(
+    db, interval=float(os.getenv("FINANCIAL_SUMMARY_REFRESH_SECONDS", 30)))
+
+
+@app.exception_handler(PoolTimeoutError)
+def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """Report an exhausted connection pool as a retryable 503"""
+    logger.warning(f"⚠️ Database pool exhausted: {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy. Please try again."},
+        headers={"Retry-After": "1"}
+    )
+
 # JWT Configuration
 SECRET_KEY = os.getenv(
     "JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
+# Built once: the JWT library would otherwise encode the key on every call
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+JWT_ALGORITHMS = [ALGORITHM]
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
+# Verified JWT claims, keyed by a digest of the token, so repeat requests with
+# the same token skip the HMAC check and JSON parse. Only valid tokens are
+# cached, and never past their own "exp".
+JWT_CACHE_TTL_SECONDS = int(os.getenv("JWT_CACHE_TTL_SECONDS", 5))
+_jwt_cache = TTLCache(maxsize=10_000, ttl=JWT_CACHE_TTL_SECONDS)
+_jwt_cache_lock = threading.Lock()  # TTLCache is not thread-safe
+
+# Bcrypt work factor for new hashes (library default is 12, ~4x slower).
+# Existing hashes keep verifying at whatever cost they were created with.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 10))
+
+# Bcrypt is CPU-bound (and releases the GIL). Running more hashes at once than
+# there are cores only time-slices them, so concurrent hashes are capped here
+# and each one finishes at full speed. The cap limits CPU, not threads: a
+# request waiting for a slot still holds one of the API_THREADPOOL_SIZE
+# workers, so a burst of logins/registrations larger than the threadpool can
+# still delay other sync routes (the per-username login throttle below only
+# limits repeats of the same account).
+PASSWORD_HASH_CONCURRENCY = int(
+    os.getenv("PASSWORD_HASH_CONCURRENCY", os.cpu_count() or 4))
+_password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+# Login throttle: after LOGIN_MAX_ATTEMPTS tries for one username, further
+# attempts get 429 (before any bcrypt work) until the username has been quiet
+# for LOGIN_WINDOW_SECONDS. In-process, so the limit applies per worker.
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", 5))
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", 60))
+_login_attempts = TTLCache(maxsize=100_000, ttl=LOGIN_WINDOW_SECONDS)
+_login_attempts_lock = threading.Lock()
+
+# Worker threads for sync (def) routes; each in-flight DB call holds one
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", 50))
+
 # Security scheme
 security = HTTPBearer()
 
@@ -67,81 +146,51 @@ security = HTTPBearer()
 # PYDANTIC MODELS (Request/Response Validation)
 # ============================================================================
 
-class UserRegister(BaseModel):
+# Rules are declared as types and Field constraints rather than @validator
+# methods, so pydantic-core checks them without calling back into Python.
+
+class RequestModel(BaseModel):
+    """Base for request bodies: unknown fields are rejected"""
+    model_config = ConfigDict(extra='forbid')
+
+
+class UserRegister(RequestModel):
     """Model for user registration request"""
     username: str
-    password: str
-    role: str
+    password: str = Field(min_length=6)
+    role: Literal['artisan', 'buyer', 'admin']
     full_name: str
     email: EmailStr
     phone: Optional[str] = None
 
-    @validator('role')
-    def validate_role(cls, v):
-        if v not in ['artisan', 'buyer', 'admin']:
-            raise ValueError('Role must be artisan, buyer, or admin')
-        return v
-
-    @validator('password')
-    def validate_password(cls, v):
-        if len(v) < 6:
-            raise ValueError('Password must be at least 6 characters')
-        return v
-
 
-class UserLogin(BaseModel):
+class UserLogin(RequestModel):
     """Model for user login request"""
     username: str
     password: str
 
 
-class ProductCreate(BaseModel):
+class ProductCreate(RequestModel):
     """Model for creating a new product"""
     product_name: str
     description: str
-    price: float
-    stock_quantity: int
+    # Matches products.price DECIMAL(10, 2)
+    price: Annotated[Decimal, Field(gt=0, max_digits=10, decimal_places=2)]
+    stock_quantity: int = Field(ge=0)
     category: str
     image_url: Optional[str] = None
 
-    @validator('price')
-    def validate_price(cls, v):
-        if v <= 0:
-            raise ValueError('Price must be positive')
-        return v
 
-    @validator('stock_quantity')
-    def validate_stock(cls, v):
-        if v < 0:
-            raise ValueError('Stock quantity cannot be negative')
-        return v
-
-
-class PurchaseRequest(BaseModel):
+class PurchaseRequest(RequestModel):
     """Model for purchase request with inventory locking"""
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
     shipping_address: str
 
-    @validator('quantity')
-    def validate_quantity(cls, v):
-        if v <= 0:
-            raise ValueError('Quantity must be positive')
-        return v
-
 
-class OrderStatusUpdate(BaseModel):
+class OrderStatusUpdate(RequestModel):
     """Model for updating order status"""
-    status: str
-
-    @validator('status')
-    def validate_status(cls, v):
-        valid_statuses = ['pending', 'processing',
-                          'shipped', 'delivered', 'cancelled']
-        if v not in valid_statuses:
-            raise ValueError(
-                f'Status must be one of: {", ".join(valid_statuses)}')
-        return v
+    status: Literal['pending', 'processing', 'shipped', 'delivered', 'cancelled']
 
 
 # ============================================================================
@@ -150,12 +199,39 @@ class OrderStatusUpdate(BaseModel):
 
 def hash_password(password: str) -> str:
     """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    with _password_hash_slots:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    with _password_hash_slots:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def check_login_rate(username: str):
+    """
+    Count a login attempt for username and refuse it once over the limit.
+
+    Raises:
+        HTTPException: 429 if the username has too many recent attempts
+    """
+    with _login_attempts_lock:
+        attempts = _login_attempts.get(username, 0) + 1
+        _login_attempts[username] = attempts
+    if attempts > LOGIN_MAX_ATTEMPTS:
+        logger.warning(f"⚠️ Login throttled for {username}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts. Please try again later.",
+            headers={"Retry-After": str(LOGIN_WINDOW_SECONDS)}
+        )
+
+
+def reset_login_rate(username: str):
+    """Clear the attempt count after a successful login"""
+    with _login_attempts_lock:
+        _login_attempts.pop(username, None)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -176,7 +252,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -193,8 +269,18 @@ def decode_token(token: str) -> dict:
     Raises:
         HTTPException: If token is invalid or expired
     """
+    # Digest rather than the token itself, so the cache holds no credentials
+    cache_key = hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+    with _jwt_cache_lock:
+        payload = _jwt_cache.get(cache_key)
+    if payload is not None and payload["exp"] > time.time():
+        return payload
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY_BYTES, algorithms=JWT_ALGORITHMS)
+        if "exp" in payload:
+            with _jwt_cache_lock:
+                _jwt_cache[cache_key] = payload
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -255,15 +341,17 @@ def register_user(user_data: UserRegister):
         User data and JWT token
     """
     try:
-        # Check if username already exists
-        existing_user = get_user_by_username(db, user_data.username)
-        if existing_user:
+        # Cheap lookup first, so a taken username is rejected without
+        # spending a bcrypt hash on it
+        if get_user_by_username(db, user_data.username):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already exists"
+                detail="Username or email already exists"
             )
 
-        # Hash password and create user
+        # Hash password and create user; the INSERT still detects a taken
+        # username/email (ON CONFLICT DO NOTHING), covering duplicate emails
+        # and a concurrent registration that wins the race after the lookup
         password_hash = hash_password(user_data.password)
         user = create_user(
             db,
@@ -277,8 +365,8 @@ def register_user(user_data: UserRegister):
 
         if not user:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create user"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username or email already exists"
             )
 
         # Create access token
@@ -299,7 +387,7 @@ def register_user(user_data: UserRegister):
             "token_type": "bearer"
         }
 
-    except HTTPException:
+    except (HTTPException, PoolTimeoutError):
         raise
     except Exception as e:
         logger.error(f"Registration error: {e}")
@@ -318,6 +406,9 @@ def login(credentials: UserLogin):
         User data and JWT token
     """
     try:
+        # Cheap counter check before the database lookup and bcrypt
+        check_login_rate(credentials.username)
+
         # Get user from database
         user = get_user_by_username(db, credentials.username)
 
@@ -333,6 +424,7 @@ def login(credentials: UserLogin):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid username or password"
             )
+        reset_login_rate(credentials.username)
 
         # Create access token
         token_data = {
@@ -354,7 +446,7 @@ def login(credentials: UserLogin):
             "token_type": "bearer"
         }
 
-    except HTTPException:
+    except (HTTPException, PoolTimeoutError):
         raise
     except Exception as e:
         logger.error(f"Login error: {e}")
@@ -377,24 +469,70 @@ def get_current_user_info(current_user: dict = Depends(get_current_user)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return user
+    return FastJSONResponse(user)
 
 
 # ============================================================================
 # API ROUTES - Products
 # ============================================================================
 
+# Lets browsers reuse product responses briefly; after that they revalidate
+# with If-None-Match. Set to 0 to always revalidate.
+PRODUCT_CACHE_MAX_AGE = int(os.getenv("PRODUCT_CACHE_MAX_AGE", 15))
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the values that identify a representation"""
+    key = ":".join(str(part) for part in parts).encode("utf-8")
+    return f'"{hashlib.blake2b(key, digest_size=16).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check whether the client's If-None-Match already covers this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def product_cache_headers(etag: str) -> dict:
+    """Caching headers shared by product responses and their 304s"""
+    return {"ETag": etag,
+            "Cache-Control": f"public, max-age={PRODUCT_CACHE_MAX_AGE}"}
+
+
 @app.get("/api/products")
-def list_products(available_only: bool = False):
+def list_products(
+    request: Request,
+    available_only: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
     """
-    List all products.
+    List products, newest first, one page at a time.
 
     Query Parameters:
         available_only: If true, only return products with stock > 0
+        limit: Page size (1-200, default 50)
+        offset: Number of products to skip
+
+    Responds 304 Not Modified (no query, no body) when If-None-Match
+    matches the current catalog version.
     """
     try:
-        products = get_all_products(db, available_only=available_only)
-        return {"products": products, "count": len(products)}
+        etag = make_etag(get_catalog_version(db), available_only, limit, offset)
+        if is_not_modified(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers=product_cache_headers(etag))
+
+        products = get_all_products(
+            db, available_only=available_only, limit=limit, offset=offset)
+        return FastJSONResponse({"products": products, "count": len(products),
+                                 "limit": limit, "offset": offset},
+                                headers=product_cache_headers(etag))
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching products: {e}")
         raise HTTPException(
@@ -404,15 +542,23 @@ def list_products(available_only: bool = False):
 
 
 @app.get("/api/products/{product_id}")
-def get_product(product_id: int):
-    """Get a single product by ID"""
-    product = get_product_by_id(db, product_id)
+async def get_product(product_id: int, request: Request):
+    """Get a single product by ID (304 if the client's ETag is current)"""
+    # Cache hits are answered on the event loop; only a miss needs a worker
+    # thread for the blocking database call
+    product = get_cached_product(product_id)
+    if product is None:
+        product = await anyio.to_thread.run_sync(get_product_by_id, db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    return product
+    etag = make_etag(product_id, product["updated_at"])
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=product_cache_headers(etag))
+    return FastJSONResponse(product, headers=product_cache_headers(etag))
 
 
 @app.post("/api/products", status_code=status.HTTP_201_CREATED)
@@ -444,8 +590,7 @@ def create_new_product(
             )
 
         # Create audit log
-        create_audit_log(
-            db,
+        audit_log.log(
             user_id=current_user["user_id"],
             action_type="product_created",
             entity_type="product",
@@ -461,7 +606,7 @@ def create_new_product(
             "product": product
         }
 
-    except HTTPException:
+    except (HTTPException, PoolTimeoutError):
         raise
     except Exception as e:
         logger.error(f"Error creating product: {e}")
@@ -480,7 +625,9 @@ def get_artisan_products(current_user: dict = Depends(require_role(["artisan"]))
     """
     try:
         products = get_products_by_artisan(db, current_user["user_id"])
-        return {"products": products, "count": len(products)}
+        return FastJSONResponse({"products": products, "count": len(products)})
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching artisan products: {e}")
         raise HTTPException(
@@ -493,6 +640,11 @@ def get_artisan_products(current_user: dict = Depends(require_role(["artisan"]))
 # API ROUTES - Purchase with Inventory Locking (CRITICAL FEATURE)
 # ============================================================================
 
+# SQLSTATE raised by place_order() when stock is too low (see schema.sql)
+INSUFFICIENT_STOCK_SQLSTATE = "AM001"
+
+PLACE_ORDER_QUERY = "SELECT * FROM place_order(%s, %s, %s, %s)"
+
 @app.post("/api/purchase/lock")
 def purchase_with_lock(
     purchase_data: PurchaseRequest,
@@ -502,15 +654,15 @@ def purchase_with_lock(
     """
     ⚠️ CRITICAL ENDPOINT: Purchase product with inventory locking
 
-    This endpoint prevents the double-selling race condition using PostgreSQL's
-    FOR UPDATE NOWAIT locking mechanism.
+    This endpoint prevents the double-selling race condition with a single
+    atomic "UPDATE ... WHERE stock_quantity >= quantity" on the product row.
 
-    Process:
+    Process (steps 2-3 run inside the place_order() database function):
     1. Start database transaction
-    2. Lock the product row using FOR UPDATE NOWAIT
-    3. Check if sufficient stock is available
-    4. If yes: Create order, update stock, create transaction, commit
-    5. If no or locked: Rollback and return error
+    2. Decrement stock only if enough is left (row-locked by the UPDATE)
+    3. If it succeeded: Create order and transaction
+    4. Commit, then queue the audit log entry
+    5. If not: Rollback and return 404 / SOLD OUT / insufficient stock
 
     This ensures that even if two buyers try to purchase the last item
     simultaneously, only one will succeed.
@@ -519,157 +671,99 @@ def purchase_with_lock(
     cursor = None
 
     try:
-        # Get database connection
-        connection = db.connection_pool.getconn()
+        # Get database connection (pooled connections are transactional: the
+        # first statement opens a transaction that we commit or roll back)
+        connection = db.acquire_connection()
         cursor = connection.cursor()
 
-        # Start transaction
-        connection.autocommit = False
-
         # ====================================================================
-        # CRITICAL SECTION: Row-level locking
+        # CRITICAL SECTION: place_order() runs server-side in one round-trip
         # ====================================================================
-        # FOR UPDATE NOWAIT locks the row immediately or fails if already locked
-        # This prevents two concurrent transactions from reading the same stock value
+        # The stock check and decrement are one UPDATE, so concurrent buyers
+        # queue on the row lock instead of failing; then the function inserts
+        # the order and transaction records
         # ====================================================================
 
-        lock_query = """
-            SELECT product_id, artisan_id, product_name, price, stock_quantity
-            FROM products
-            WHERE product_id = %s
-            FOR UPDATE NOWAIT
-        """
-
         try:
-            cursor.execute(lock_query, (purchase_data.product_id,))
-            product = cursor.fetchone()
-        except Exception as lock_error:
-            # If we can't get the lock, another transaction is processing this product
-            connection.rollback()
-            logger.warning(
-                f"⚠️ Lock conflict for product {purchase_data.product_id}")
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Product is currently being purchased by another customer. Please try again."
+            # Prepared once per pooled connection, then EXECUTEd
+            db.execute_prepared(
+                cursor,
+                PLACE_ORDER_QUERY,
+                (current_user["user_id"], purchase_data.product_id,
+                 purchase_data.quantity, purchase_data.shipping_address)
             )
-
-        if not product:
+            order = cursor.fetchone()
+        except errors.NoDataFound:
             connection.rollback()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
-
-        product_id, artisan_id, product_name, price, stock_quantity = product
-
-        # Check if sufficient stock is available
-        if stock_quantity < purchase_data.quantity:
+        except psycopg2.Error as stock_error:
+            if stock_error.pgcode != INSUFFICIENT_STOCK_SQLSTATE:
+                raise
             connection.rollback()
+            stock_quantity = int(stock_error.diag.message_detail)
 
             if stock_quantity == 0:
                 logger.warning(
-                    f"⚠️ SOLD OUT: Product {product_id} ({product_name})")
+                    f"⚠️ SOLD OUT: Product {purchase_data.product_id}")
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"SOLD OUT: This item is no longer available"
                 )
             else:
                 logger.warning(
-                    f"⚠️ Insufficient stock for product {product_id}")
+                    f"⚠️ Insufficient stock for product {purchase_data.product_id}")
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Insufficient stock. Only {stock_quantity} items available"
                 )
 
-        # Calculate total price
-        total_price = price * purchase_data.quantity
-
-        # Update stock (reduce by purchased quantity)
-        new_stock = stock_quantity - purchase_data.quantity
-        update_stock_query = """
-            UPDATE products 
-            SET stock_quantity = %s 
-            WHERE product_id = %s
-        """
-        cursor.execute(update_stock_query, (new_stock, product_id))
-
-        # Create order
-        create_order_query = """
-            INSERT INTO orders (buyer_id, product_id, quantity, total_price, shipping_address)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING order_id, created_at
-        """
-        cursor.execute(
-            create_order_query,
-            (current_user["user_id"], product_id, purchase_data.quantity,
-             total_price, purchase_data.shipping_address)
-        )
-        order_result = cursor.fetchone()
-        order_id, created_at = order_result
-
-        # Create transaction record (with 5% commission)
-        commission_rate = 0.05
-        commission_fee = round(total_price * commission_rate, 2)
-        artisan_payout = round(total_price - commission_fee, 2)
-
-        create_transaction_query = """
-            INSERT INTO transactions (order_id, artisan_id, buyer_id, product_id,
-                                     amount, commission_fee, artisan_payout)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING transaction_id
-        """
-        cursor.execute(
-            create_transaction_query,
-            (order_id, artisan_id, current_user["user_id"], product_id,
-             total_price, commission_fee, artisan_payout)
-        )
-        transaction_result = cursor.fetchone()
-        transaction_id = transaction_result[0]
-
-        # Create audit log
-        import json
-        audit_details = {
-            "product_name": product_name,
-            "quantity": purchase_data.quantity,
-            "total_price": float(total_price),
-            "old_stock": stock_quantity,
-            "new_stock": new_stock
-        }
-
-        create_audit_query = """
-            INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id, 
-                                   details, ip_address)
-            VALUES (%s, %s, %s, %s, %s::jsonb, %s)
-        """
-        cursor.execute(
-            create_audit_query,
-            (current_user["user_id"], "purchase", "order", order_id,
-             json.dumps(audit_details), request.client.host)
-        )
+        (order_id, transaction_id, product_name, stock_quantity, new_stock,
+         total_price, commission_fee, artisan_payout, created_at) = order
 
         # Commit transaction - all changes are applied atomically
         connection.commit()
+        invalidate_product_cache(purchase_data.product_id)
+
+        # Written in the background after the row lock is released
+        audit_log.log(
+            user_id=current_user["user_id"],
+            action_type="purchase",
+            entity_type="order",
+            entity_id=order_id,
+            details={
+                "product_name": product_name,
+                "quantity": purchase_data.quantity,
+                "total_price": total_price,
+                "old_stock": stock_quantity,
+                "new_stock": new_stock
+            },
+            ip_address=request.client.host
+        )
 
         logger.info(
             f"✓ PURCHASE SUCCESS: Order {order_id} - {product_name} x{purchase_data.quantity} "
             f"by {current_user['username']} - Stock: {stock_quantity} → {new_stock}"
         )
 
-        return {
+        # Decimal and datetime values are encoded by FastJSONResponse
+        return FastJSONResponse({
             "message": "Purchase successful",
             "order_id": order_id,
             "transaction_id": transaction_id,
             "product_name": product_name,
             "quantity": purchase_data.quantity,
-            "total_price": float(total_price),
-            "commission_fee": float(commission_fee),
-            "artisan_payout": float(artisan_payout),
+            "total_price": total_price,
+            "commission_fee": commission_fee,
+            "artisan_payout": artisan_payout,
             "remaining_stock": new_stock,
-            "created_at": created_at.isoformat()
-        }
+            "created_at": created_at
+        })
 
-    except HTTPException:
-        # Re-raise HTTP exceptions (400, 404, 409)
+    except (HTTPException, PoolTimeoutError):
+        # Re-raise HTTP exceptions (400, 404) and pool timeouts (503)
         raise
 
     except Exception as e:
@@ -687,20 +781,64 @@ def purchase_with_lock(
         if cursor:
             cursor.close()
         if connection:
-            connection.autocommit = True
-            db.connection_pool.putconn(connection)
+            db.release_connection(connection)
 
 
 # ============================================================================
 # API ROUTES - Orders
 # ============================================================================
 
+def make_page_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode the last row of a page as an opaque keyset cursor"""
+    return f"{created_at.isoformat()}_{row_id}"
+
+
+def parse_page_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor from make_page_cursor() into (created_at, row_id).
+
+    Raises:
+        HTTPException: If the cursor is malformed
+    """
+    try:
+        created_at, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid page cursor"
+        )
+
+
+def order_page(orders: list, limit: int) -> dict:
+    """Wrap one page of orders with the cursor for the next page"""
+    next_cursor = None
+    if len(orders) == limit:
+        last = orders[-1]
+        next_cursor = make_page_cursor(last["created_at"], last["order_id"])
+    return {"orders": orders, "count": len(orders), "next_cursor": next_cursor}
+
+
 @app.get("/api/buyer/orders")
-def get_buyer_orders(current_user: dict = Depends(require_role(["buyer"]))):
-    """Get all orders by the current buyer"""
+def get_buyer_orders(
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(require_role(["buyer"]))
+):
+    """
+    Get the current buyer's orders, newest first, one page at a time.
+
+    Query Parameters:
+        before: next_cursor from the previous page (omit for the first page)
+        limit: Page size (1-200, default 50)
+    """
     try:
-        orders = get_orders_by_buyer(db, current_user["user_id"])
-        return {"orders": orders, "count": len(orders)}
+        orders = get_orders_by_buyer(
+            db, current_user["user_id"], limit=limit,
+            before=parse_page_cursor(before) if before else None)
+        return FastJSONResponse(order_page(orders, limit))
+    except (HTTPException, PoolTimeoutError):
+        raise
     except Exception as e:
         logger.error(f"Error fetching buyer orders: {e}")
         raise HTTPException(
@@ -710,11 +848,25 @@ def get_buyer_orders(current_user: dict = Depends(require_role(["buyer"]))):
 
 
 @app.get("/api/artisan/orders")
-def get_artisan_orders(current_user: dict = Depends(require_role(["artisan"]))):
-    """Get all orders for the current artisan's products"""
+def get_artisan_orders(
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(require_role(["artisan"]))
+):
+    """
+    Get orders for the current artisan's products, newest first, one page at a time.
+
+    Query Parameters:
+        before: next_cursor from the previous page (omit for the first page)
+        limit: Page size (1-200, default 50)
+    """
     try:
-        orders = get_orders_by_artisan(db, current_user["user_id"])
-        return {"orders": orders, "count": len(orders)}
+        orders = get_orders_by_artisan(
+            db, current_user["user_id"], limit=limit,
+            before=parse_page_cursor(before) if before else None)
+        return FastJSONResponse(order_page(orders, limit))
+    except (HTTPException, PoolTimeoutError):
+        raise
     except Exception as e:
         logger.error(f"Error fetching artisan orders: {e}")
         raise HTTPException(
@@ -744,8 +896,7 @@ def update_status(
             )
 
         # Create audit log
-        create_audit_log(
-            db,
+        audit_log.log(
             user_id=current_user["user_id"],
             action_type="status_update",
             entity_type="order",
@@ -762,7 +913,7 @@ def update_status(
             "new_status": status_data.status
         }
 
-    except HTTPException:
+    except (HTTPException, PoolTimeoutError):
         raise
     except Exception as e:
         logger.error(f"Error updating order status: {e}")
@@ -777,33 +928,39 @@ def update_status(
 # ============================================================================
 
 @app.get("/api/admin/audit/transactions")
-def get_financial_audit(current_user: dict = Depends(require_role(["admin"]))):
+def get_financial_audit(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(require_role(["admin"]))
+):
     """
-    Get complete financial audit log (Admin only).
+    Get the financial audit log (Admin only).
 
-    Returns all transactions with commission calculations for oversight.
+    Returns one page of transactions with commission calculations, plus
+    all-time totals from the financial_summary materialized view (refreshed
+    every FINANCIAL_SUMMARY_REFRESH_SECONDS).
+
+    Query Parameters:
+        limit: Page size (1-1000, default 100)
+        offset: Number of transactions to skip
     """
     try:
-        transactions = get_all_transactions(db)
-
-        # Calculate summary statistics
-        total_revenue = sum(t["amount"] for t in transactions)
-        total_commission = sum(t["commission_fee"] for t in transactions)
-        total_artisan_payout = sum(t["artisan_payout"] for t in transactions)
+        transactions = get_all_transactions(db, limit=limit, offset=offset)
+        summary = get_transactions_summary(db)
 
         logger.info(
             f"✓ Admin {current_user['username']} accessed financial audit")
 
-        return {
+        return FastJSONResponse({
             "transactions": transactions,
             "count": len(transactions),
-            "summary": {
-                "total_revenue": float(total_revenue),
-                "total_commission": float(total_commission),
-                "total_artisan_payout": float(total_artisan_payout)
-            }
-        }
+            "limit": limit,
+            "offset": offset,
+            "summary": summary
+        })
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching financial audit: {e}")
         raise HTTPException(
@@ -812,17 +969,55 @@ def get_financial_audit(current_user: dict = Depends(require_role(["admin"]))):
         )
 
 
+@app.get("/api/admin/audit/daily")
+def get_daily_audit(
+    days: int = Query(30, ge=1, le=366),
+    current_user: dict = Depends(require_role(["admin"]))
+):
+    """
+    Get per-day revenue, commission and payout totals (Admin only).
+
+    Query Parameters:
+        days: Number of days to include (default 30)
+    """
+    try:
+        since = datetime.utcnow() - timedelta(days=days)
+        totals = get_daily_transaction_totals(db, since)
+        return FastJSONResponse({"days": totals, "count": len(totals)})
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching daily audit totals: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch audit data"
+        )
+
+
 @app.get("/api/admin/users")
-def get_all_users(current_user: dict = Depends(require_role(["admin"]))):
-    """Get all users (Admin only)"""
+def get_all_users(
+    before: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    current_user: dict = Depends(require_role(["admin"]))
+):
+    """
+    Get users, newest first, one page at a time (Admin only).
+
+    Query Parameters:
+        before: next_cursor from the previous page (omit for the first page)
+        limit: Page size (1-500, default 100)
+    """
     try:
-        query = """
-            SELECT user_id, username, role, full_name, email, phone, created_at
-            FROM users
-            ORDER BY created_at DESC
-        """
-        users = db.execute_query(query)
-        return {"users": users, "count": len(users)}
+        users = get_users(db, limit=limit,
+                          before=parse_page_cursor(before) if before else None)
+        next_cursor = None
+        if len(users) == limit:
+            last = users[-1]
+            next_cursor = make_page_cursor(last["created_at"], last["user_id"])
+        return FastJSONResponse({"users": users, "count": len(users),
+                                 "next_cursor": next_cursor})
+    except (HTTPException, PoolTimeoutError):
+        raise
     except Exception as e:
         logger.error(f"Error fetching users: {e}")
         raise HTTPException(
@@ -836,13 +1031,13 @@ def get_all_users(current_user: dict = Depends(require_role(["admin"]))):
 # ============================================================================
 
 @app.get("/")
-def root():
+async def root():
     """Serve the frontend HTML application"""
     return FileResponse("app.html")
 
 
 @app.get("/api")
-def api_info():
+async def api_info():
     """API information endpoint"""
     return {
         "message": "Local Artisan E-Marketplace API",
@@ -863,9 +1058,21 @@ def api_info():
 # APPLICATION LIFECYCLE
 # ============================================================================
 
+@app.on_event("startup")
+async def startup_event():
+    """Size the threadpool that runs the synchronous database routes"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = API_THREADPOOL_SIZE
+    logger.info(f"✓ Route threadpool size: {API_THREADPOOL_SIZE}")
+    audit_log.start()
+    summary_refresher.start()
+
+
 @app.on_event("shutdown")
 def shutdown_event():
     """Clean up database connections on shutdown"""
+    summary_refresher.stop()
+    audit_log.stop()  # Flush queued audit entries while connections are open
     db.close_all_connections()
     logger.info("✓ Application shutdown complete")
 
@@ -883,19 +1090,21 @@ def shutdown_event():
 #    - CORS configured to allow frontend access
 #
 # 2. INVENTORY LOCKING MECHANISM (THE CORE FEATURE):
-#    - Uses PostgreSQL's "SELECT ... FOR UPDATE NOWAIT"
-#    - Locks the product row during the entire purchase transaction
-#    - If another request tries to lock the same row, it fails immediately
+#    - Uses "UPDATE products SET stock_quantity = stock_quantity - qty
+#      WHERE product_id = ? AND stock_quantity >= qty"
+#    - The check and the decrement are one statement, so there is no gap
+#      between reading stock and writing it for another request to slip into
+#    - The UPDATE row-locks the product until commit; a concurrent purchase
+#      waits, then re-checks the WHERE clause against the new stock
 #    - Prevents race condition: Two buyers trying to buy the last item
 #
 #    Example scenario:
 #    - Product has 1 item in stock
 #    - Buyer A clicks "Purchase" at 10:00:00.000
 #    - Buyer B clicks "Purchase" at 10:00:00.001
-#    - Buyer A's request locks the row first
-#    - Buyer B's request gets "NOWAIT" error → "Product currently being purchased"
-#    - Buyer A's purchase completes, stock becomes 0
-#    - Buyer B tries again, gets "SOLD OUT" error
+#    - Buyer A's UPDATE matches (1 >= 1) and sets stock to 0
+#    - Buyer B's UPDATE waits for A to commit, then matches no row (0 >= 1)
+#    - Buyer B gets "SOLD OUT" error
 #    - Result: No double-selling, data integrity maintained
 #
 # 3. REST API DESIGN:
@@ -906,16 +1115,15 @@ def shutdown_event():
 #
 # 4. TRANSACTION MANAGEMENT:
 #    - Purchase endpoint performs multiple operations atomically:
-#      a) Lock product row
-#      b) Check stock
-#      c) Update stock
-#      d) Create order
-#      e) Create transaction record
-#      f) Create audit log
+#      a) Check and update stock (one conditional UPDATE)
+#      b) Create order
+#      c) Create transaction record
 #    - If ANY step fails, ALL changes are rolled back (ACID compliance)
 #
 # 5. AUDIT TRAIL:
 #    - Every critical action is logged with user_id, timestamp, and details
+#    - Entries are queued and written in batches by a background thread,
+#      so they never hold a request (or a product row lock) open
 #    - Admin can review all purchases and status changes
 #    - Helps with debugging and dispute resolution
 #
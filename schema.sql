@@ -2,7 +2,7 @@
 -- Local Artisan E-Marketplace Database Schema
 -- ============================================================================
 -- Purpose: Secure database design for preventing double-selling of unique items
--- Key Feature: Inventory locking using PostgreSQL's FOR UPDATE NOWAIT
+-- Key Feature: Inventory locking using an atomic conditional stock UPDATE
 -- ============================================================================
 
 -- Drop existing tables if they exist (for clean setup)
@@ -10,6 +10,7 @@ DROP TABLE IF EXISTS audit_logs CASCADE;
 DROP TABLE IF EXISTS transactions CASCADE;
 DROP TABLE IF EXISTS orders CASCADE;
 DROP TABLE IF EXISTS products CASCADE;
+DROP TABLE IF EXISTS catalog_version CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 
 -- ============================================================================
@@ -29,8 +30,12 @@ CREATE TABLE users (
 );
 
 -- Indexes for users table
-CREATE INDEX idx_username ON users(username);
+-- (username lookups use the index behind the UNIQUE constraint)
 CREATE INDEX idx_role ON users(role);
+-- Covering index for the admin user list: keyset pages on (created_at, user_id)
+-- are index-only scans with no sort
+CREATE INDEX idx_users_created ON users(created_at DESC, user_id DESC)
+    INCLUDE (username, role, full_name, email, phone);
 
 -- ============================================================================
 -- 2. PRODUCTS TABLE
@@ -54,6 +59,9 @@ CREATE TABLE products (
 CREATE INDEX idx_artisan ON products(artisan_id);
 CREATE INDEX idx_category ON products(category);
 CREATE INDEX idx_stock ON products(stock_quantity);
+-- Serve the newest-first product listings without a sort step
+CREATE INDEX idx_products_created ON products(created_at DESC, product_id DESC);
+CREATE INDEX idx_products_available ON products(created_at DESC, product_id DESC) WHERE stock_quantity > 0;
 
 -- ============================================================================
 -- 3. ORDERS TABLE
@@ -74,8 +82,12 @@ CREATE TABLE orders (
 );
 
 -- Indexes for orders table
-CREATE INDEX idx_buyer ON orders(buyer_id);
-CREATE INDEX idx_product ON orders(product_id);
+-- Composite indexes serve the keyset-paginated order lists (newest first,
+-- order_id breaking timestamp ties) as well as plain buyer_id / product_id
+-- lookups. Artisan orders are reached through products(artisan_id), then
+-- idx_product per product.
+CREATE INDEX idx_buyer ON orders(buyer_id, created_at DESC, order_id DESC);
+CREATE INDEX idx_product ON orders(product_id, created_at DESC, order_id DESC);
 CREATE INDEX idx_status ON orders(status);
 CREATE INDEX idx_created ON orders(created_at);
 
@@ -91,8 +103,11 @@ CREATE TABLE transactions (
     buyer_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
     product_id INTEGER NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
     amount DECIMAL(10, 2) NOT NULL CHECK (amount >= 0),  -- Total purchase amount
-    commission_fee DECIMAL(10, 2) NOT NULL CHECK (commission_fee >= 0),  -- 5% platform fee
-    artisan_payout DECIMAL(10, 2) NOT NULL CHECK (artisan_payout >= 0),  -- 95% to artisan
+    -- Derived from amount by the database, so the split is always consistent
+    commission_fee DECIMAL(10, 2)
+        GENERATED ALWAYS AS (ROUND(amount * 0.05, 2)) STORED,  -- 5% platform fee
+    artisan_payout DECIMAL(10, 2)
+        GENERATED ALWAYS AS (amount - ROUND(amount * 0.05, 2)) STORED,  -- 95% to artisan
     payment_status VARCHAR(20) NOT NULL DEFAULT 'completed' 
         CHECK (payment_status IN ('completed', 'pending', 'failed', 'refunded')),
     transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -161,6 +176,32 @@ CREATE TRIGGER update_product_modtime
     FOR EACH ROW
     EXECUTE FUNCTION update_product_timestamp();
 
+-- Catalog version: bumped by every product insert, update or delete. The API
+-- uses it as the product list ETag and cache key. It is a one-row table (not
+-- a sequence) so a new version only becomes visible when the product change
+-- commits, and a rolled-back change never moves it. The trigger is DEFERRED:
+-- the bump runs at COMMIT, so the row lock it takes is held only for the
+-- commit itself rather than the whole writing transaction.
+CREATE TABLE catalog_version (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO catalog_version DEFAULT VALUES;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE catalog_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER products_version_bump
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_catalog_version();
+
 -- Function to update order updated_at timestamp
 CREATE OR REPLACE FUNCTION update_order_timestamp()
 RETURNS TRIGGER AS $$
@@ -176,6 +217,86 @@ CREATE TRIGGER update_order_modtime
     FOR EACH ROW
     EXECUTE FUNCTION update_order_timestamp();
 
+-- ============================================================================
+-- PURCHASE FUNCTION (INVENTORY LOCKING)
+-- ============================================================================
+-- Runs the whole purchase (stock, order and transaction) as one server-side
+-- statement, so the API pays one round-trip. The audit log entry is queued by
+-- the API afterwards, outside the row lock. Errors:
+--   P0002 (no_data_found)      - product does not exist
+--   AM001 (custom)             - insufficient stock; DETAIL holds current stock
+CREATE OR REPLACE FUNCTION place_order(
+    p_buyer_id INTEGER,
+    p_product_id INTEGER,
+    p_quantity INTEGER,
+    p_shipping_address TEXT
+)
+RETURNS TABLE (
+    order_id INTEGER,
+    transaction_id INTEGER,
+    product_name VARCHAR,
+    old_stock INTEGER,
+    new_stock INTEGER,
+    total_price DECIMAL(10, 2),
+    commission_fee DECIMAL(10, 2),
+    artisan_payout DECIMAL(10, 2),
+    created_at TIMESTAMP
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_stock INTEGER;
+BEGIN
+    -- CRITICAL: check and decrement stock in one statement. The row lock is
+    -- taken by the UPDATE itself; a concurrent buyer waits for it, then
+    -- re-evaluates the WHERE clause against the committed stock, so stock can
+    -- never go negative and nobody is turned away just for arriving second.
+    -- The order and transaction inserts chain off the UPDATE in the same
+    -- statement; if it matches no row they insert nothing.
+    RETURN QUERY
+    WITH upd AS (
+        UPDATE products
+        SET stock_quantity = products.stock_quantity - p_quantity
+        WHERE products.product_id = p_product_id
+          AND products.stock_quantity >= p_quantity
+        RETURNING products.product_id, products.artisan_id,
+                  products.product_name, products.stock_quantity,
+                  products.price * p_quantity AS amount
+    ),
+    ord AS (
+        INSERT INTO orders (buyer_id, product_id, quantity, total_price, shipping_address)
+        SELECT p_buyer_id, upd.product_id, p_quantity, upd.amount, p_shipping_address
+        FROM upd
+        RETURNING orders.order_id, orders.created_at
+    ),
+    txn AS (
+        -- commission_fee and artisan_payout are generated columns
+        INSERT INTO transactions (order_id, artisan_id, buyer_id, product_id, amount)
+        SELECT ord.order_id, upd.artisan_id, p_buyer_id, upd.product_id, upd.amount
+        FROM ord, upd
+        RETURNING transactions.transaction_id, transactions.commission_fee,
+                  transactions.artisan_payout
+    )
+    SELECT ord.order_id, txn.transaction_id, upd.product_name,
+           upd.stock_quantity + p_quantity, upd.stock_quantity,
+           upd.amount, txn.commission_fee, txn.artisan_payout, ord.created_at
+    FROM upd, ord, txn;
+
+    IF NOT FOUND THEN
+        SELECT products.stock_quantity INTO v_stock
+        FROM products
+        WHERE products.product_id = p_product_id;
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Product % not found', p_product_id
+                USING ERRCODE = 'no_data_found';
+        END IF;
+
+        RAISE EXCEPTION 'Insufficient stock for product %', p_product_id
+            USING ERRCODE = 'AM001', DETAIL = v_stock::TEXT;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================================================
 -- VIEWS FOR COMMON QUERIES
 -- ============================================================================
@@ -184,6 +305,7 @@ CREATE TRIGGER update_order_modtime
 CREATE OR REPLACE VIEW artisan_products_view AS
 SELECT 
     p.product_id,
+    p.artisan_id,
     p.product_name,
     p.price,
     p.stock_quantity,
@@ -193,7 +315,7 @@ SELECT
     COALESCE(SUM(o.total_price), 0) as total_revenue
 FROM products p
 LEFT JOIN orders o ON p.product_id = o.product_id AND o.status != 'cancelled'
-GROUP BY p.product_id;
+GROUP BY p.product_id, p.artisan_id;  -- artisan_id grouped so filters push down to idx_artisan
 
 -- View for admin financial audit: Complete transaction overview
 CREATE OR REPLACE VIEW admin_financial_audit AS
@@ -215,6 +337,21 @@ JOIN users u_buyer ON t.buyer_id = u_buyer.user_id
 JOIN products p ON t.product_id = p.product_id
 ORDER BY t.transaction_date DESC;
 
+-- Materialized all-time totals for the admin audit page. The API refreshes it
+-- in the background (REFRESH ... CONCURRENTLY, so readers are never blocked);
+-- the unique index is required for a concurrent refresh.
+DROP MATERIALIZED VIEW IF EXISTS financial_summary;
+CREATE MATERIALIZED VIEW financial_summary AS
+SELECT
+    1 AS summary_id,
+    COUNT(*) AS transaction_count,
+    COALESCE(SUM(amount), 0) AS total_revenue,
+    COALESCE(SUM(commission_fee), 0) AS total_commission,
+    COALESCE(SUM(artisan_payout), 0) AS total_artisan_payout
+FROM transactions;
+
+CREATE UNIQUE INDEX idx_financial_summary ON financial_summary(summary_id);
+
 -- ============================================================================
 -- EXPLANATION FOR FACULTY
 -- ============================================================================
@@ -223,7 +360,7 @@ ORDER BY t.transaction_date DESC;
 --
 -- 1. INVENTORY LOCKING MECHANISM:
 --    - The stock_quantity field in products table is the critical control point
---    - Using PostgreSQL's "FOR UPDATE NOWAIT" in purchase transactions
+--    - Purchases decrement it with "UPDATE ... WHERE stock_quantity >= qty"
 --    - This prevents race conditions when two buyers try to purchase the last item
 --
 -- 2. ROLE-BASED ACCESS CONTROL:
@@ -233,7 +370,7 @@ ORDER BY t.transaction_date DESC;
 --
 -- 3. FINANCIAL TRANSPARENCY:
 --    - Transactions table records every purchase with commission calculation
---    - 5% platform fee is automatically calculated and stored separately
+--    - 5% platform fee is calculated by generated columns and stored separately
 --    - Admin can audit all financial activities through the financial_audit view
 --
 -- 4. AUDIT TRAIL: